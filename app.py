@@ -1,14 +1,19 @@
-from flask import Flask, render_template, request, redirect, url_for, session
+from flask import Flask, render_template, request, redirect, url_for, jsonify
 import logic
-import plotly.io as pio
-import plotly
+import store
 import os
-import pandas as pd
 import math
 
 app = Flask(__name__)
-app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'supersecretkey')  # Needed for session
-app.config['PERMANENT_SESSION_LIFETIME'] = 86400  # 1 day
+app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'supersecretkey')
+# Details pages carry no per-user state, so CDNs and reverse proxies may cache them
+app.config['DETAILS_CACHE_SECONDS'] = int(os.environ.get('DETAILS_CACHE_SECONDS', 3600))
+
+# Import the heavy request-path dependencies while the worker boots instead of
+# on the first request. Set WATERFX_PREWARM=0 for a fast start during development.
+if os.environ.get('WATERFX_PREWARM', '1') != '0':
+    for module, seconds in logic.prewarm('web').items():
+        print(f"DEBUG: prewarmed {module} in {seconds * 1000:.1f} ms")
 
 # --- Add this filter for 3 significant figures, plain notation ---
 def sigfig_plain(value, sig=3):
@@ -33,10 +38,6 @@ def sigfig_plain(value, sig=3):
 app.jinja_env.filters['sigfig_plain'] = sigfig_plain
 # --- End filter ---
 
-@app.before_request
-def make_session_permanent():
-    session.permanent = True
-
 # Home page: search form
 @app.route('/', methods=['GET', 'POST'])
 def index():
@@ -51,30 +52,35 @@ def index():
 @app.route('/select', methods=['GET', 'POST'])
 def select():
     pwsname = request.args.get('pwsname', '').strip()
+    if request.method == 'POST':
+        # The choice is carried in the URL; details resolves it locally, so
+        # there is no need to repeat the EPA search or stash the record.
+        pwsid = request.form.get('pwsid', '').strip()
+        if pwsid:
+            return redirect(url_for('details', pwsid=pwsid))
     matches = logic.fetch_records(pwsname)
     if not matches:
         return render_template('select.html', pwsname=pwsname, matches=[], error="No matches found.")
     if request.method == 'POST':
-        pwsid = request.form.get('pwsid')
-        rec = next((m for m in matches if m.get('pwsid') == pwsid or m.get('PWSId') == pwsid), None)
-        if rec:
-            session['selected_pws'] = rec
-            print("DEBUG: select route - session['selected_pws'] set:", session['selected_pws'])
-            return redirect(url_for('details', pwsid=pwsid))
-        else:
-            print("DEBUG: select route - record not found for pwsid:", pwsid)
-            return render_template('select.html', pwsname=pwsname, matches=matches, error="Selected PWS not found.")
+        return render_template('select.html', pwsname=pwsname, matches=matches, error="Selected PWS not found.")
     return render_template('select.html', pwsname=pwsname, matches=matches)
 
 # Show details for selected PWS
 @app.route('/details/<pwsid>')
 def details(pwsid):
-    rec = session.get('selected_pws')
-    if not rec or (rec.get('pwsid') != pwsid and rec.get('PWSId') != pwsid):
-        print("DEBUG: details route - PWS not found or session expired.")
-        return render_template('details.html', error="PWS not found or session expired. Please search again.")
+    try:
+        rec = logic.lookup_pws(pwsid)
+    except Exception as e:
+        print("DEBUG: details route - EPA lookup failed:", e)
+        return render_template('details.html', error="Could not look up this PWS right now. Please try again."), 503, {'Cache-Control': 'no-store'}
+    if not rec:
+        print("DEBUG: details route - PWS not found:", pwsid)
+        return render_template('details.html', error="PWS not found. Please search again."), 404, {'Cache-Control': 'no-store'}
+    if pwsid != rec['pwsid']:
+        # One URL (and one cache key) per system
+        return redirect(url_for('details', pwsid=rec['pwsid']), code=301)
     # Use the selected pwsid for all further data
-    pwsid_actual = rec.get('pwsid') or rec.get('PWSId')
+    pwsid_actual = rec['pwsid']
     colonias_by_pws, blocks_gdf, census_df, pws_gdf, blocks_grouped = logic.basic_setup()
     # Overview info
     try:
@@ -92,6 +98,17 @@ def details(pwsid):
         print("DEBUG: details route - error scraping fact page:", e)
         df_ent = df_fac = df_gv = df_iv = None
         url = url2 = None  # Ensure both are defined
+    # Keep the analytics store current with whatever we just scraped;
+    # save_scrape leaves stored data alone if this scrape looks partial.
+    # The store is secondary to this page, so a failure is only logged.
+    store_ok = True
+    try:
+        if df_ent is not None and not store.save_scrape(pwsid_actual, df_fac, df_gv, df_iv):
+            print("DEBUG: details route - incomplete scrape, store not updated for", pwsid_actual)
+        store.save_colonias(colonias_by_pws[colonias_by_pws["PWSId"] == pwsid_actual])
+    except Exception as e:
+        print("DEBUG: details route - error saving to store:", e)
+        store_ok = False
     # Extract entity info smartly
     entity_info = {}
     contact_info = {}
@@ -110,19 +127,8 @@ def details(pwsid):
             return round(float(x), 3)
         except Exception:
             return x
-    def calc_weighted_metrics(row):
-        geoids  = row['GEOID']
-        weights = row['percent_overlap']
-        metrics = census_df.loc[geoids]
-        weighted = metrics.multiply(weights, axis=0)
-        return weighted.sum() / sum(weights)
-    def get_metrics(pwsId, blocks_grouped):
-        metrics = blocks_grouped.apply(calc_weighted_metrics, axis=1, result_type='expand')
-        blocks_grouped = pd.concat([blocks_grouped, metrics], axis=1)
-        blocks_grouped = blocks_grouped.set_index("PWSId")[['amhi', 'total_pop', 'unemp_count', 'poverty_rate', 'avg_household_size']]
-        return blocks_grouped.loc[pwsId]
     try:
-        metrics = get_metrics(pwsid_actual, blocks_grouped)
+        metrics = logic.get_metrics(pwsid_actual, blocks_grouped, census_df)
     except Exception as e:
         print("DEBUG: details route - error getting metrics:", e)
         metrics = None
@@ -178,12 +184,13 @@ def details(pwsid):
     group_viol_list = df_gv.to_dict(orient='records') if df_gv is not None else []
     indiv_viol_list = df_iv.to_dict(orient='records') if df_iv is not None else []
     try:
+        import plotly.io as pio
         fig = logic.draw_pws_blocks(pwsid_actual, pws_gdf, blocks_gdf)
         map_html = pio.to_html(fig, full_html=False)
     except Exception as e:
         print("DEBUG: details route - error drawing map:", e)
         map_html = None
-    return render_template(
+    html = render_template(
         'details.html',
         rec=rec,
         colonias_served=colonias,
@@ -201,6 +208,67 @@ def details(pwsid):
         url=url,
         url2=url2
     )
+    # Only let shared caches keep a complete page; a failed scrape, metrics or
+    # map lookup should be retried on the next request.
+    complete = (df_ent is not None and not df_ent.empty and metrics is not None
+                and map_html is not None and store_ok)
+    if complete:
+        cache_control = f"public, max-age={app.config['DETAILS_CACHE_SECONDS']}"
+    else:
+        cache_control = 'no-store'
+    return html, 200, {'Cache-Control': cache_control}
+
+# --- Statewide analytics over the violations/facilities store ---
+
+def api_limit():
+    try:
+        return max(1, min(int(request.args.get('limit', 1000)), 10000))
+    except ValueError:
+        return 1000
+
+def api_error(message):
+    return jsonify({'error': message}), 400
+
+# e.g. /api/violations?contaminant=E.%20COLI&years=2&colonia=1
+@app.route('/api/violations')
+def api_violations():
+    try:
+        since = store.since_date(request.args.get('since'), request.args.get('years'))
+    except ValueError as e:
+        return api_error(str(e))
+    rows = store.query_violations(
+        contaminant=request.args.get('contaminant'),
+        since=since,
+        pwsid=request.args.get('pwsid'),
+        colonia_only=request.args.get('colonia') == '1',
+        limit=api_limit(),
+    )
+    return jsonify(rows)
+
+# Systems ranked by matching violation count
+@app.route('/api/systems/violations')
+def api_systems_violations():
+    try:
+        since = store.since_date(request.args.get('since'), request.args.get('years'))
+    except ValueError as e:
+        return api_error(str(e))
+    rows = store.systems_with_violations(
+        contaminant=request.args.get('contaminant'),
+        since=since,
+        colonia_only=request.args.get('colonia') == '1',
+        limit=api_limit(),
+    )
+    return jsonify(rows)
+
+@app.route('/api/facilities')
+def api_facilities():
+    rows = store.query_facilities(
+        facility_type=request.args.get('type'),
+        status=request.args.get('status'),
+        pwsid=request.args.get('pwsid'),
+        limit=api_limit(),
+    )
+    return jsonify(rows)
 
 if __name__ == '__main__':
     app.run(host="0.0.0.0", debug=True)
\ No newline at end of file
@@ -0,0 +1,252 @@
+from flask import Flask, request, abort, Response
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from urllib.parse import urlencode
+
+import logic
+
+# Local stand-ins for data.epa.gov, api.census.gov and dww2.tceq.texas.gov.
+# Responses are replayed from a recordings directory; anything not recorded
+# is either fetched from the real service and saved (--record) or synthesized
+# from the local shapefile tables so the app can run fully offline.
+#
+#   python -m loadtest.fake_services --port 5001 --latency dww=1.5 --error-rate 0.01
+#   WATERFX_EPA_URL=http://127.0.0.1:5001/efservice \
+#   WATERFX_CENSUS_URL=http://127.0.0.1:5001 \
+#   WATERFX_DWW_URL=http://127.0.0.1:5001/ python3 app.py
+
+SERVICES = {
+    'epa': ('/efservice/', "https://data.epa.gov"),
+    'census': ('/data/', "https://api.census.gov"),
+    'dww': ('/DWW/', "https://dww2.tceq.texas.gov"),
+}
+
+RECORDINGS_DIR = os.path.join(os.path.dirname(__file__), 'recordings')
+
+def service_for(path):
+    for service, (prefix, _) in SERVICES.items():
+        if path.startswith(prefix):
+            return service
+    return None
+
+def recording_path(recordings_dir, service, path, args):
+    # The census API key is not part of the identity of a response
+    query = sorted((k, v) for k, v in args.items(multi=True) if k != 'key')
+    digest = hashlib.sha1(f"{path}?{urlencode(query)}".encode()).hexdigest()
+    return os.path.join(recordings_dir, service, digest + '.json')
+
+def load_recording(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        rec = json.load(f)
+    return Response(rec['body'], status=rec['status'], content_type=rec['content_type'])
+
+def record_upstream(service, path, full_path):
+    import requests
+    upstream = SERVICES[service][1]
+    resp = requests.get(upstream + full_path)
+    rec = {
+        'url': full_path,
+        'status': resp.status_code,
+        'content_type': resp.headers.get('Content-Type', 'text/plain'),
+        'body': resp.text,
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(rec, f)
+    return Response(rec['body'], status=rec['status'], content_type=rec['content_type'])
+
+# --- Synthesized responses ---
+
+def synth_epa(path):
+    # sdwis.sdw_county_served/pwsid/<id>/json, as used by logic.lookup_pws
+    match = re.search(r'pwsid/([^/]+)', path)
+    if match:
+        pwsid = match.group(1).upper()
+        rec = logic.load_pws_index().get(pwsid)
+        matches = [{'pwsid': pwsid, 'pwsname': rec.get('pwsname'), 'primacy_agency_code': 'TX',
+                    'county_served': None}] if rec else []
+        return Response(json.dumps(matches), content_type='application/json')
+    # sdwis.sdw_county_served/pwsname/like/@WORD@/.../json
+    words = [w.strip('@').upper() for w in re.findall(r'pwsname/like/([^/]+)', path)]
+    matches = []
+    for pwsid, rec in sorted(logic.load_pws_index().items()):
+        name = (rec.get('pwsname') or '').upper()
+        if words and all(w in name for w in words):
+            matches.append({
+                'pwsid': pwsid,
+                'pwsname': rec.get('pwsname'),
+                'primacy_agency_code': 'TX',
+                'county_served': None,
+            })
+    return Response(json.dumps(matches), content_type='application/json')
+
+_tracts = None
+
+def synth_census(args):
+    global _tracts
+    if _tracts is None:
+        import geopandas as gpd
+        _tracts = gpd.read_file("data/tl_2024_48_tract/tl_2024_48_tract.dbf", ignore_geometry=True)
+    variables = args.get('get', '').split(',')
+    rows = [variables + ['state', 'county', 'tract']]
+    for tract in _tracts[['STATEFP', 'COUNTYFP', 'TRACTCE']].itertuples(index=False):
+        rng = random.Random(tract.STATEFP + tract.COUNTYFP + tract.TRACTCE)
+        pop = rng.randint(500, 9000)
+        values = {
+            'B01003_001E': pop,
+            'B19013_001E': rng.randint(18000, 140000),
+            'B23025_005E': rng.randint(0, pop // 10),
+            'B25010_001E': round(rng.uniform(1.8, 4.2), 2),
+            'B17001_002E': rng.randint(0, pop // 3),
+        }
+        rows.append([str(values.get(v, 0)) for v in variables] + [tract.STATEFP, tract.COUNTYFP, tract.TRACTCE])
+    return Response(json.dumps(rows), content_type='application/json')
+
+def html_table(title, header, rows):
+    out = [f"<table><tbody><tr><th colspan='{len(header)}'>{title}</th></tr>",
+           "<tr>" + "".join(f"<td>{h}</td>" for h in header) + "</tr>"]
+    for row in rows:
+        out.append("<tr>" + "".join(f"<td>{c}</td>" for c in row) + "</tr>")
+    out.append("</tbody></table>")
+    return "\n".join(out)
+
+CONTAMINANTS = ["3014 E. COLI", "3100 COLIFORM (TCR)", "1040 NITRATE", "2456 TOTAL HALOACETIC ACIDS (HAA5)", "0999 CHLORINE"]
+FACILITY_TYPES = ["WELL", "STORAGE", "TREATMENT PLANT", "DISTRIBUTION SYSTEM"]
+
+def synth_violations(rng, n):
+    rows = []
+    for _ in range(n):
+        date = f"{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}-{rng.randint(2015, 2025)}"
+        rows.append([f"{rng.randint(100000, 999999)}", date, "", "MCL, MONTHLY (TCR)", "", rng.choice(CONTAMINANTS)])
+    return rows
+
+def synth_dww(path, args):
+    pwsid = (args.get('number') or args.get('tinwsys_st_code') or 'TX0000000').upper()
+    rec = logic.lookup_pws(pwsid) or {'pwsid': pwsid, 'pwsname': 'UNKNOWN SYSTEM'}
+    rng = random.Random(pwsid)
+    if path.endswith('SearchDispatch'):
+        body = html_table("Water Systems", ["Water System No.", "Water System Name", "Type", "Status"], [[
+            f"<a href='/DWW/JSP/WaterSystemDetail.jsp?tinwsys_st_code={pwsid}'>{pwsid}</a>",
+            f"<a href='/DWW/JSP/WaterSystemFacts.jsp?number={pwsid}'>{rec['pwsname']}</a>",
+            "C", "A",
+        ]])
+    elif path.endswith('WaterSystemDetail.jsp'):
+        body = "\n".join([
+            html_table("WS Flow Rates", ["Type", "Value", "Unit"], [
+                ["Provided Production Capacity", f"{rng.uniform(0.1, 20):.3f}", "MGD"],
+                ["Max Daily Demand", f"{rng.uniform(0.1, 10):.3f}", "MGD"],
+                ["Average Daily Consumption", f"{rng.uniform(0.05, 5):.3f}", "MGD"],
+            ]),
+            html_table("WS Measures", ["Type", "Value", "Unit"], [
+                ["Total Storage Capacity", f"{rng.randint(10, 5000) * 1000}", "GAL"],
+                ["Elevated Storage Capacity", f"{rng.randint(0, 500) * 1000}", "GAL"],
+            ]),
+        ])
+    elif path.endswith('WaterSystemFacts.jsp'):
+        labels = [
+            ("Water System No.", pwsid), ("System Name", rec['pwsname']), ("Federal Type", "C"),
+            ("Federal Source", "GW"), ("Principal County Served", "HIDALGO"), ("Population Served", rng.randint(50, 50000)),
+        ]
+        entity = "<table><tbody>" + "".join(
+            f"<tr><td><font>{label}</font></td><td>{value}</td></tr>" for label, value in labels
+        ) + "</tbody></table>"
+        phones = "<table><tbody><tr><td>BUS</td><td>(956) 555-0100</td></tr></tbody></table>"
+        contacts = html_table("Water System Contacts", ["Type", "Contact", "Phone"], [
+            ["Administrative Contact", f"OPERATOR, {rec['pwsname']}", phones],
+        ])
+        operating = html_table("Annual Operating Period", ["Start", "End", "Type", "", "", "Population"], [
+            ["1", "1", "12", "31", "R", rng.randint(50, 50000)],
+        ])
+        connections = html_table("Service Connection", ["Type", "Count", "Meter Type", "Meter Size"], [
+            ["RS", rng.randint(20, 20000), "ME", "0.75"],
+        ])
+        facilities = html_table("Water System Facilities", ["ID", "Name", "Type - Status"], [
+            [f"G{pwsid[2:]}{chr(65 + i)}", "", f"{rng.choice(FACILITY_TYPES)} - A"] for i in range(rng.randint(1, 6))
+        ])
+        header = ["Violation No.", "Date", "", "Violation", "", "Contaminant"]
+        individual = html_table("Individual Violations", header, synth_violations(rng, rng.randint(0, 8)))
+        group = html_table("Group Violations", header, synth_violations(rng, rng.randint(0, 3)))
+        body = "\n".join([entity, contacts, operating, connections, facilities, individual, group])
+    else:
+        abort(404)
+    return Response(f"<html><body>{body}</body></html>", content_type='text/html')
+
+def create_app(recordings_dir=RECORDINGS_DIR, latency=None, jitter=0.0, error_rate=None, record=False, seed=None):
+    # latency and error_rate map service name ('epa', 'census', 'dww' or
+    # 'default') to seconds / probability of answering 503
+    latency = latency or {}
+    error_rate = error_rate or {}
+    rng = random.Random(seed)
+    app = Flask(__name__)
+
+    @app.before_request
+    def inject_faults():
+        service = service_for(request.path)
+        if service is None:
+            return
+        delay = latency.get(service, latency.get('default', 0.0))
+        if delay or jitter:
+            time.sleep(max(0.0, delay + rng.uniform(-jitter, jitter)))
+        if rng.random() < error_rate.get(service, error_rate.get('default', 0.0)):
+            abort(503)
+
+    @app.route('/efservice/<path:path>')
+    @app.route('/data/<path:path>')
+    @app.route('/DWW/<path:path>')
+    def serve(path):
+        service = service_for(request.path)
+        rec_path = recording_path(recordings_dir, service, request.path, request.args)
+        resp = load_recording(rec_path)
+        if resp is not None:
+            return resp
+        if record:
+            return record_upstream(service, rec_path, request.full_path)
+        if service == 'epa':
+            return synth_epa(path)
+        if service == 'census':
+            return synth_census(request.args)
+        return synth_dww(path, request.args)
+
+    return app
+
+def parse_service_values(values):
+    # ["0.2", "dww=1.5"] -> {'default': 0.2, 'dww': 1.5}
+    parsed = {}
+    for value in values or []:
+        service, _, number = value.rpartition('=')
+        parsed[service or 'default'] = float(number)
+    return parsed
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Local stand-ins for the EPA, Census and DWW services")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--recordings', default=RECORDINGS_DIR)
+    parser.add_argument('--latency', action='append', metavar='[SERVICE=]SECONDS',
+                        help="added response latency, globally or per service (epa, census, dww)")
+    parser.add_argument('--jitter', type=float, default=0.0, metavar='SECONDS')
+    parser.add_argument('--error-rate', action='append', metavar='[SERVICE=]P',
+                        help="probability of answering 503, globally or per service")
+    parser.add_argument('--record', action='store_true',
+                        help="fetch and save responses missing from the recordings instead of synthesizing them")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+    app = create_app(
+        recordings_dir=args.recordings,
+        latency=parse_service_values(args.latency),
+        jitter=args.jitter,
+        error_rate=parse_service_values(args.error_rate),
+        record=args.record,
+        seed=args.seed,
+    )
+    app.run(host=args.host, port=args.port, threaded=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import logic
+
+# Open-loop load generator for the WaterFX app. Requests are issued at a fixed
+# rate regardless of how fast the app answers, so queueing shows up as latency
+# rather than as a lower offered load. Process stats are read from /proc and
+# are only available on Linux.
+#
+#   python -m loadtest.load_generator http://127.0.0.1:5000 --rps 5 --duration 60 --pid <app pid>
+
+# select_post submits the select form (POST /select -> 302 /details/<pwsid>);
+# redirects are not followed, so details is only measured on its own.
+DEFAULT_MIX = {'index': 1, 'select': 2, 'select_post': 1, 'details': 1}
+
+def parse_mix(value):
+    # "index=1,select=2,select_post=1,details=1"
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"Unknown endpoint in mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def sample_systems(n, seed=None):
+    rng = random.Random(seed)
+    index = logic.load_pws_index()
+    pwsids = rng.sample(sorted(index), min(n, len(index)))
+    return [(pwsid, index[pwsid].get('pwsname') or '') for pwsid in pwsids]
+
+def build_request(endpoint, system, rng):
+    # -> (method, path, form data)
+    pwsid, pwsname = system
+    if endpoint == 'index':
+        return 'GET', '/', None
+    if endpoint in ('select', 'select_post'):
+        # Search on one word of the name, as a user typing a town name would
+        words = [w for w in pwsname.split() if len(w) > 3] or pwsname.split() or ['WATER']
+        path = '/select?pwsname=' + rng.choice(words)
+        if endpoint == 'select_post':
+            return 'POST', path, {'pwsid': pwsid}
+        return 'GET', path, None
+    return 'GET', f'/details/{pwsid}', None
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+def process_tree(pid):
+    # pid plus all of its descendants, e.g. gunicorn master and workers
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        p = stack.pop()
+        tree.append(p)
+        stack.extend(children.get(p, []))
+    return tree
+
+def rss_bytes(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+def chrome_process_count():
+    count = 0
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/comm') as f:
+                if 'chrome' in f.read().lower():
+                    count += 1
+        except OSError:
+            continue
+    return count
+
+class ProcessMonitor(threading.Thread):
+    def __init__(self, pids, interval=1.0):
+        super().__init__(daemon=True)
+        self.pids = pids
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            rss = sum(rss_bytes(p) for pid in self.pids for p in process_tree(pid))
+            self.samples.append({'time': time.time(), 'rss': rss, 'chrome': chrome_process_count()})
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def summary(self):
+        if not self.samples:
+            return {}
+        return {
+            'worker_rss_mb_peak': max(s['rss'] for s in self.samples) / 2**20 if self.pids else None,
+            'worker_rss_mb_final': self.samples[-1]['rss'] / 2**20 if self.pids else None,
+            'chrome_processes_peak': max(s['chrome'] for s in self.samples),
+            'chrome_processes_final': self.samples[-1]['chrome'],
+        }
+
+def run(base_url, rps, duration, mix=None, pids=None, timeout=120, max_workers=256, systems=50, seed=None):
+    import requests
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    targets = sample_systems(systems, seed)
+    endpoints, weights = zip(*mix.items())
+    results = []
+    lock = threading.Lock()
+    http = requests.Session()
+    http.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=max_workers))
+
+    def fire(endpoint, method, path, data):
+        start = time.perf_counter()
+        try:
+            status = http.request(method, base_url + path, data=data, timeout=timeout,
+                                  allow_redirects=False).status_code
+        except requests.RequestException:
+            status = None
+        with lock:
+            results.append((endpoint, status, time.perf_counter() - start))
+
+    monitor = ProcessMonitor(pids or [])
+    monitor.start()
+    start = time.perf_counter()
+    sent = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while True:
+            due = start + sent / rps
+            if due - start >= duration:
+                break
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            endpoint = rng.choices(endpoints, weights)[0]
+            pool.submit(fire, endpoint, *build_request(endpoint, rng.choice(targets), rng))
+            sent += 1
+    elapsed = time.perf_counter() - start
+    monitor.stop()
+    return report(results, sent, elapsed, monitor.summary())
+
+def report(results, sent, elapsed, process_stats):
+    summary = {
+        'sent': sent,
+        'completed': len(results),
+        'elapsed_s': elapsed,
+        'throughput_rps': len(results) / elapsed if elapsed else 0.0,
+        'endpoints': {},
+    }
+    summary.update(process_stats)
+    for endpoint in DEFAULT_MIX:
+        rows = [r for r in results if r[0] == endpoint]
+        if not rows:
+            continue
+        latencies = [r[2] for r in rows]
+        statuses = {}
+        for _, status, _ in rows:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        summary['endpoints'][endpoint] = {
+            'count': len(rows),
+            'errors': sum(1 for r in rows if r[1] is None or r[1] >= 500),
+            'statuses': statuses,
+            'p50_s': percentile(latencies, 50),
+            'p90_s': percentile(latencies, 90),
+            'p99_s': percentile(latencies, 99),
+            'max_s': max(latencies),
+        }
+    return summary
+
+def print_report(summary):
+    print(f"sent {summary['sent']}, completed {summary['completed']} in {summary['elapsed_s']:.1f}s "
+          f"({summary['throughput_rps']:.2f} req/s)")
+    print(f"{'endpoint':<12}{'count':>7}{'errors':>8}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    for endpoint, s in summary['endpoints'].items():
+        print(f"{endpoint:<12}{s['count']:>7}{s['errors']:>8}"
+              f"{s['p50_s']:>9.3f}{s['p90_s']:>9.3f}{s['p99_s']:>9.3f}{s['max_s']:>9.3f}")
+    if summary.get('worker_rss_mb_peak') is not None:
+        print(f"worker RSS: peak {summary['worker_rss_mb_peak']:.0f} MB, final {summary['worker_rss_mb_final']:.0f} MB")
+    if 'chrome_processes_peak' in summary:
+        print(f"chrome processes: peak {summary['chrome_processes_peak']}, final {summary['chrome_processes_final']}")
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Drive the WaterFX app at a target request rate")
+    parser.add_argument('base_url', help="e.g. http://127.0.0.1:5000")
+    parser.add_argument('--rps', type=float, default=1.0)
+    parser.add_argument('--duration', type=float, default=30.0, metavar='SECONDS')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help="endpoint weights, e.g. index=1,select=2,select_post=1,details=1")
+    parser.add_argument('--pid', type=int, action='append',
+                        help="app process to measure memory for (children included); repeatable")
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--max-workers', type=int, default=256)
+    parser.add_argument('--systems', type=int, default=50, help="number of PWSIDs to draw requests from")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args(argv)
+    summary = run(args.base_url.rstrip('/'), args.rps, args.duration, mix=args.mix, pids=args.pid,
+                  timeout=args.timeout, max_workers=args.max_workers, systems=args.systems, seed=args.seed)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_report(summary)
+
+if __name__ == '__main__':
+    main()
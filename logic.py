@@ -1,12 +1,49 @@
 import pandas as pd
-
-def basic_setup():
+import os
+import time
+
+# External services. Override to point at local stand-ins (see loadtest/).
+EPA_BASE_URL = os.environ.get('WATERFX_EPA_URL', "https://data.epa.gov/efservice")
+CENSUS_BASE_URL = os.environ.get('WATERFX_CENSUS_URL', "https://api.census.gov")
+DWW_BASE_URL = os.environ.get('WATERFX_DWW_URL', "https://dww2.tceq.texas.gov/")
+
+# Modules each entry point needs, imported up front by prewarm() so the cost
+# is paid at worker boot / CLI start rather than on the first request.
+STARTUP_PROFILES = {
+    'web': ['requests', 'geopandas', 'plotly.graph_objects', 'plotly.io', 'selenium.webdriver'],
+    'search': ['requests'],
+    'metrics': ['requests', 'geopandas'],
+    'scrape': ['selenium.webdriver'],
+    'map': ['geopandas', 'plotly.graph_objects'],
+}
+
+IMPORT_TIMINGS = {}
+
+def prewarm(profile):
+    import importlib
+    import sys
+    for module in STARTUP_PROFILES[profile]:
+        if module in IMPORT_TIMINGS or module in sys.modules:
+            IMPORT_TIMINGS.setdefault(module, 0.0)
+            continue
+        start = time.perf_counter()
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            print(f"Could not prewarm {module}: {e}")
+            continue
+        IMPORT_TIMINGS[module] = time.perf_counter() - start
+    return {m: IMPORT_TIMINGS[m] for m in STARTUP_PROFILES[profile] if m in IMPORT_TIMINGS}
+
+def load_pws_layer():
   import geopandas as gpd
-  import plotly.graph_objects as go
-  import requests
-  import sys
-
   pws_gdf = gpd.read_file("data/PWS_shapefile/PWS_Export.shp")
+  if pws_gdf.crs is None:
+      raise ValueError("One of the shapefiles is missing a CRS. Please ensure all shapefiles have a valid CRS.")
+  return pws_gdf
+
+def load_colonias_by_pws(pws_gdf):
+  import geopandas as gpd
   colonias_gdf = gpd.read_file("data/Colonia_shapefile/COLONIAS_COMMUNITIES.shp")
 
   if pws_gdf.crs is None or colonias_gdf.crs is None:
@@ -21,14 +58,21 @@ def basic_setup():
       })
       .reset_index()
   )
+  return colonias_by_pws
 
+def load_blocks(pws_gdf):
+  # Census tracts in the PWS layer's CRS, with their original area
+  import geopandas as gpd
   blocks_gdf = gpd.read_file("data/tl_2024_48_tract/tl_2024_48_tract.shp")
   if pws_gdf.crs is None or blocks_gdf.crs is None:
       raise ValueError("One of the shapefiles is missing a CRS. Please ensure all shapefiles have a valid CRS.")
   if pws_gdf.crs != blocks_gdf.crs:
       blocks_gdf = blocks_gdf.to_crs(pws_gdf.crs)
   blocks_gdf['orig_area'] = blocks_gdf.geometry.area
+  return blocks_gdf
 
+def group_blocks_by_pws(blocks_gdf, pws_gdf):
+  import geopandas as gpd
   intersection = gpd.overlay(blocks_gdf, pws_gdf, how='intersection')
   intersection['intersection_area'] = intersection.geometry.area
   intersection = intersection.merge(
@@ -45,7 +89,9 @@ def basic_setup():
         .agg(list)
         .reset_index()
   )
+  return blocks_grouped
 
+def to_map_crs(pws_gdf, blocks_gdf):
   pws_gdf = pws_gdf.to_crs(epsg=4326)
   blocks_gdf = blocks_gdf.to_crs(epsg=4326)
 
@@ -53,6 +99,10 @@ def basic_setup():
   blocks_gdf['county'] = blocks_gdf['GEOID'].str[2:5]
   blocks_gdf['tract'] = blocks_gdf['GEOID'].str[5:11]
   blocks_gdf['blkgrp'] = blocks_gdf['GEOID'].str[11:]
+  return pws_gdf, blocks_gdf
+
+def load_census():
+  import requests
 
   variables = {
       'B01003_001E': 'total_pop',
@@ -62,7 +112,7 @@ def basic_setup():
       'B17001_002E': 'poverty_count'
   }
 
-  endpoint = "https://api.census.gov/data/2021/acs/acs5"
+  endpoint = f"{CENSUS_BASE_URL}/data/2021/acs/acs5"
   params = {
       "get": ",".join(variables.keys()),
       "for": "tract:*",
@@ -86,9 +136,29 @@ def basic_setup():
     + census_df['tract']
   )
   census_df= census_df.set_index('GEOID')[['total_pop', 'unemp_count', 'poverty_rate','amhi', 'avg_household_size']]
+  return census_df
+
+def basic_setup():
+  pws_gdf = load_pws_layer()
+  colonias_by_pws = load_colonias_by_pws(pws_gdf)
+  blocks_gdf = load_blocks(pws_gdf)
+  blocks_grouped = group_blocks_by_pws(blocks_gdf, pws_gdf)
+  pws_gdf, blocks_gdf = to_map_crs(pws_gdf, blocks_gdf)
+  census_df = load_census()
 
   return colonias_by_pws, blocks_gdf, census_df, pws_gdf, blocks_grouped
 
+def get_metrics(pwsId, blocks_grouped, census_df):
+    # Census metrics for one PWS, weighted by each tract's overlap share
+    row = blocks_grouped.loc[blocks_grouped['PWSId'] == pwsId].iloc[0]
+    geoids  = row['GEOID']
+    weights = row['percent_overlap']
+    metrics = census_df.loc[geoids]
+    weighted = metrics.multiply(weights, axis=0)
+    metrics = weighted.sum() / sum(weights)
+    metrics.name = pwsId
+    return metrics[['amhi', 'total_pop', 'unemp_count', 'poverty_rate', 'avg_household_size']]
+
 def draw_pws_blocks(pws_id, pws_gdf,blocks_gdf):
     import plotly.graph_objects as go
     import geopandas as gpd
@@ -167,7 +237,7 @@ def get_dww_url(pwsId):
     action = "action=Search+For+Water+Systems"
     join="&"
 
-    BASE = "https://dww2.tceq.texas.gov/"
+    BASE = DWW_BASE_URL
     SEARCH = f"{BASE}/DWW/JSP/SearchDispatch?"
     url = f"{SEARCH}{number}{join}{action}"
 
@@ -460,7 +530,7 @@ def scrape_fact_page(pwsid, url, url2):
 def fetch_records(name):
     import requests
     import urllib.parse
-    base_url = "https://data.epa.gov/efservice"
+    base_url = EPA_BASE_URL
     table    = "sdwis.sdw_county_served"
     fmt      = "json"
     sort     = "pwsid/asc"
@@ -479,7 +549,68 @@ def fetch_records(name):
     resp.raise_for_status()
     return resp.json()
 
-def main():
+def fetch_record_by_id(pwsid):
+    import requests
+    import urllib.parse
+    url = f"{EPA_BASE_URL}/sdwis.sdw_county_served/pwsid/{urllib.parse.quote(pwsid)}/json"
+    resp = requests.get(url)
+    resp.raise_for_status()
+    records = resp.json()
+    # One row per county served; the first is enough to identify the system
+    return records[0] if records else None
+
+PWS_TABLE_PATH = "data/PWS_shapefile/PWS_Export.dbf"
+SDWIS_SNAPSHOT_PATH = "data/sdwis_snapshot.json"
+
+_pws_index = None
+
+def load_pws_index():
+    # PWSID-keyed identity table so /details/<pwsid> can be resolved without
+    # a session or, usually, another EPA call. Built once per process from the
+    # attribute table of PWS_Export (no geometry needed) and overlaid with a
+    # cached SDWIS snapshot (same record shape as fetch_records) if present.
+    global _pws_index
+    if _pws_index is not None:
+        return _pws_index
+    import json
+    index = {}
+    if os.path.exists(PWS_TABLE_PATH):
+        import geopandas as gpd
+        pws_df = gpd.read_file(PWS_TABLE_PATH, ignore_geometry=True)
+        for row in pws_df[['PWSId', 'pwsName']].itertuples(index=False):
+            if row.PWSId:
+                index[row.PWSId] = {'pwsid': row.PWSId, 'pwsname': row.pwsName}
+    if os.path.exists(SDWIS_SNAPSHOT_PATH):
+        with open(SDWIS_SNAPSHOT_PATH) as f:
+            for rec in json.load(f):
+                pwsid = rec.get('pwsid') or rec.get('PWSId')
+                if pwsid:
+                    merged = dict(index.get(pwsid, {}))
+                    merged.update(rec)
+                    merged['pwsid'] = pwsid
+                    index[pwsid] = merged
+    _pws_index = index
+    return _pws_index
+
+def lookup_pws(pwsid):
+    # Systems without a service-area polygon in PWS_Export (but listed by the
+    # EPA search) are looked up once by PWSID and remembered. Misses are not
+    # cached, and EPA errors propagate to the caller.
+    if not pwsid:
+        return None
+    pwsid = pwsid.strip().upper()
+    index = load_pws_index()
+    rec = index.get(pwsid)
+    if rec is None:
+        found = fetch_record_by_id(pwsid)
+        if found:
+            rec = dict(found)
+            rec['pwsid'] = found.get('pwsid') or found.get('PWSId') or pwsid
+            rec.setdefault('pwsname', found.get('PWSName'))
+            index[pwsid] = rec
+    return rec
+
+def demo():
     # TEMPORARY HARDCODED TEST CASE
     colonias_by_pws, blocks_gdf, census_df, pws_gdf, blocks_grouped = basic_setup()
     sample_name = "CITY OF LYFORD"
@@ -521,5 +652,94 @@ def main():
 
     return
 
+def cli_search(args):
+    for rec in fetch_records(args.name):
+        print(f"{rec.get('pwsid') or rec.get('PWSId')}  {rec.get('pwsname', rec.get('PWSName'))}")
+
+def require_pws(pwsid):
+    # Fail fast on unknown or typo'd IDs before any data layer is loaded
+    import sys
+    try:
+        rec = lookup_pws(pwsid)
+    except Exception as e:
+        sys.exit(f"Could not look up PWSID {pwsid}: {e}")
+    if not rec:
+        sys.exit(f"Unknown PWSID: {pwsid}")
+    return rec['pwsid']
+
+def require_service_area(pwsid, pws_gdf):
+    import sys
+    selected = pws_gdf[pws_gdf['PWSId'] == pwsid]
+    if selected.empty:
+        sys.exit(f"PWSID {pwsid} has no service area in PWS_Export")
+    return selected
+
+def cli_metrics(args):
+    pwsid = require_pws(args.pwsid)
+    pws_gdf = load_pws_layer()
+    selected = require_service_area(pwsid, pws_gdf)
+    blocks_gdf = load_blocks(pws_gdf)
+    blocks_grouped = group_blocks_by_pws(blocks_gdf, selected)
+    if blocks_grouped.empty:
+        import sys
+        sys.exit(f"PWSID {pwsid} does not overlap any census tract")
+    census_df = load_census()
+    print(get_metrics(pwsid, blocks_grouped, census_df))
+
+def cli_scrape(args):
+    url, url2 = get_dww_url(args.pwsid)
+    df_ent, df_fac, df_grp_viol, df_indv_viol = scrape_fact_page(args.pwsid, url, url2)
+    print("\nEntity:")
+    print(df_ent)
+    print("\nFacilities:")
+    print(df_fac)
+    print("\nGroup Violations:")
+    print(df_grp_viol)
+    print("\nIndividual Violations:")
+    print(df_indv_viol)
+
+def cli_map(args):
+    pwsid = require_pws(args.pwsid)
+    pws_gdf = load_pws_layer()
+    require_service_area(pwsid, pws_gdf)
+    blocks_gdf = load_blocks(pws_gdf)
+    pws_gdf, blocks_gdf = to_map_crs(pws_gdf, blocks_gdf)
+    fig = draw_pws_blocks(pwsid, pws_gdf, blocks_gdf)
+    fig.write_html(args.out)
+    print(f"Map written to {args.out}")
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="WaterFX command line tools")
+    parser.add_argument('--import-times', action='store_true',
+                        help="print how long the subcommand's dependencies took to import")
+    subparsers = parser.add_subparsers(dest='command')
+
+    p = subparsers.add_parser('search', help="search SDWIS by system name")
+    p.add_argument('name')
+    p.set_defaults(func=cli_search)
+
+    p = subparsers.add_parser('metrics', help="census metrics for one system")
+    p.add_argument('pwsid')
+    p.set_defaults(func=cli_metrics)
+
+    p = subparsers.add_parser('scrape', help="scrape the DWW fact sheet for one system")
+    p.add_argument('pwsid')
+    p.set_defaults(func=cli_scrape)
+
+    p = subparsers.add_parser('map', help="write the service area map for one system")
+    p.add_argument('pwsid')
+    p.add_argument('--out', default='map.html')
+    p.set_defaults(func=cli_map)
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        return demo()
+    timings = prewarm(args.command)
+    if args.import_times:
+        for module, seconds in timings.items():
+            print(f"import {module}: {seconds * 1000:.1f} ms")
+    return args.func(args)
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,364 @@
+import os
+import re
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+# Typed, indexed copy of what scrape_fact_page harvests, so statewide
+# questions ("systems with E. coli violations serving colonias in the last
+# two years") don't need a scrape per system. SQLite keeps it dependency-free.
+
+DB_PATH = os.environ.get('WATERFX_DB', "data/waterfx.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS violations (
+    pwsid            TEXT NOT NULL,
+    kind             TEXT NOT NULL,          -- 'individual' or 'group'
+    violation_no     TEXT NOT NULL,
+    violation_date   TEXT,                   -- ISO yyyy-mm-dd
+    violation        TEXT,
+    contaminant_code TEXT,
+    contaminant      TEXT,
+    PRIMARY KEY (pwsid, kind, violation_no)
+);
+CREATE INDEX IF NOT EXISTS ix_violations_date ON violations (violation_date);
+CREATE INDEX IF NOT EXISTS ix_violations_contaminant ON violations (contaminant_code, violation_date);
+
+CREATE TABLE IF NOT EXISTS facilities (
+    pwsid           TEXT NOT NULL,
+    facility_id     TEXT NOT NULL,
+    facility_type   TEXT,
+    facility_status TEXT,
+    PRIMARY KEY (pwsid, facility_id)
+);
+CREATE INDEX IF NOT EXISTS ix_facilities_type ON facilities (facility_type);
+
+CREATE TABLE IF NOT EXISTS system_capacity (
+    pwsid          TEXT PRIMARY KEY,
+    production_mgd REAL,
+    avg_daily_mgd  REAL,
+    max_daily_mgd  REAL,
+    storage_gal    REAL,                     -- normalized to gallons
+    scraped_at     TEXT
+);
+
+-- Code/name pairs seen in violations, so name searches resolve to codes
+-- and can use ix_violations_contaminant
+CREATE TABLE IF NOT EXISTS contaminants (
+    code TEXT PRIMARY KEY,
+    name TEXT
+);
+
+CREATE TABLE IF NOT EXISTS colonia_systems (
+    pwsid   TEXT NOT NULL,
+    colonia TEXT NOT NULL,
+    PRIMARY KEY (pwsid, colonia)
+);
+CREATE INDEX IF NOT EXISTS ix_colonia_systems_colonia ON colonia_systems (colonia);
+"""
+
+def connect(path=None):
+    conn = sqlite3.connect(path or DB_PATH)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+# --- Normalization of scraped strings ---
+
+def is_missing(value):
+    # scrape_fact_page's placeholder rows hold None, which pandas may turn into NaN
+    if value is None:
+        return True
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):
+        return False
+
+def clean_text(value):
+    if is_missing(value):
+        return None
+    value = str(value).strip()
+    return value or None
+
+def parse_date(value):
+    # DWW dates look like 01-15-2023 or 01/15/2023
+    value = clean_text(value)
+    if value is None:
+        return None
+    for fmt in ("%m-%d-%Y", "%m/%d/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+def parse_number(value):
+    # "1.234", ".5", "12,000 GAL", "Not Available" -> 1.234, 0.5, 12000.0, None
+    if is_missing(value):
+        return None
+    match = re.search(r'-?(?:\d[\d,]*)?\.?\d+', str(value))
+    if not match:
+        return None
+    try:
+        return float(match.group(0).replace(',', ''))
+    except ValueError:
+        return None
+
+def parse_unit(value):
+    if is_missing(value):
+        return None
+    match = re.search(r'[\d.,]+\s*([A-Za-z]+)\s*$', str(value).strip())
+    return match.group(1).upper() if match else None
+
+# Gallons per storage unit as shown on DWW
+STORAGE_UNITS = {'GAL': 1, 'GALS': 1, 'GALLONS': 1, 'KGAL': 1e3, 'MG': 1e6, 'MGAL': 1e6}
+
+def parse_storage_gal(value):
+    # "12,000 GAL" -> 12000.0, "0.5 MG" -> 500000.0; unknown units -> None
+    number = parse_number(value)
+    factor = STORAGE_UNITS.get(parse_unit(value))
+    if number is None or factor is None:
+        return None
+    return number * factor
+
+def split_contaminant(value):
+    # "3014 E. COLI" -> ("3014", "E. COLI")
+    value = clean_text(value)
+    if value is None:
+        return None, None
+    match = re.match(r'^(\d{4})\s*[-:]?\s*(.*)$', value)
+    if match:
+        return match.group(1), match.group(2).strip() or None
+    return None, value
+
+# --- Writes ---
+
+def violation_rows(pwsid, kind, df):
+    rows = []
+    if df is None or df.empty:
+        return rows
+    for rec in df.to_dict(orient='records'):
+        viol_no = clean_text(rec.get('Violation No.'))
+        if viol_no is None:
+            continue
+        code, name = split_contaminant(rec.get('Contaminant'))
+        rows.append((pwsid, kind, viol_no, parse_date(rec.get('Date')),
+                     clean_text(rec.get('Violation')), code, name))
+    return rows
+
+def scrape_complete(df_fac):
+    # A partly loaded DWW page shows up as no facility rows or no flow-rate
+    # table (every flow value left at "Not Available"); storing that would
+    # wipe good data from an earlier scrape.
+    if df_fac is None or df_fac.empty:
+        return False
+    if not facility_rows(None, df_fac):
+        return False
+    first = df_fac.iloc[0]
+    return any(parse_number(first.get(col)) is not None for col in ('production_mgd', 'avg_daily', 'max_daily'))
+
+def facility_rows(pwsid, df_fac):
+    rows = []
+    for rec in df_fac.to_dict(orient='records'):
+        facility_id = clean_text(rec.get('facility_id'))
+        if facility_id is not None:
+            rows.append((pwsid, facility_id, clean_text(rec.get('facility_type')), clean_text(rec.get('facility_status'))))
+    return rows
+
+def save_scrape(pwsid, df_fac, df_gv, df_iv, conn=None):
+    # Replaces everything stored for pwsid with the latest scrape. Returns
+    # False, leaving the store untouched, when the scrape looks incomplete.
+    if not scrape_complete(df_fac):
+        return False
+    own = conn is None
+    conn = conn or connect()
+    try:
+        violations = violation_rows(pwsid, 'individual', df_iv) + violation_rows(pwsid, 'group', df_gv)
+        with conn:
+            conn.execute("DELETE FROM violations WHERE pwsid = ?", (pwsid,))
+            conn.executemany("INSERT OR REPLACE INTO violations VALUES (?, ?, ?, ?, ?, ?, ?)", violations)
+            conn.executemany(
+                "INSERT OR REPLACE INTO contaminants VALUES (?, ?)",
+                {(row[5], row[6]) for row in violations if row[5] and row[6]},
+            )
+            conn.execute("DELETE FROM facilities WHERE pwsid = ?", (pwsid,))
+            conn.executemany("INSERT OR REPLACE INTO facilities VALUES (?, ?, ?, ?)", facility_rows(pwsid, df_fac))
+            first = df_fac.iloc[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO system_capacity VALUES (?, ?, ?, ?, ?, ?)",
+                (pwsid, parse_number(first.get('production_mgd')), parse_number(first.get('avg_daily')),
+                 parse_number(first.get('max_daily')), parse_storage_gal(first.get('storage_cap')),
+                 datetime.now().isoformat(timespec='seconds')),
+            )
+        return True
+    finally:
+        if own:
+            conn.close()
+
+def save_colonias(colonias_by_pws, conn=None):
+    # colonias_by_pws as returned by logic.load_colonias_by_pws (PWSId, NAME list).
+    # Systems whose stored colonias already match are left alone, so this is
+    # cheap to call on every details view.
+    own = conn is None
+    conn = conn or connect()
+    try:
+        wanted = {}
+        for rec in colonias_by_pws.to_dict(orient='records'):
+            wanted.setdefault(rec['PWSId'], set()).update(rec['NAME'])
+        changed = {}
+        for pwsid, names in wanted.items():
+            stored = {r[0] for r in conn.execute("SELECT colonia FROM colonia_systems WHERE pwsid = ?", (pwsid,))}
+            if stored != names:
+                changed[pwsid] = names
+        if not changed:
+            return False
+        with conn:
+            conn.executemany("DELETE FROM colonia_systems WHERE pwsid = ?", [(pwsid,) for pwsid in changed])
+            conn.executemany("INSERT OR REPLACE INTO colonia_systems VALUES (?, ?)",
+                             [(pwsid, name) for pwsid, names in changed.items() for name in names])
+        return True
+    finally:
+        if own:
+            conn.close()
+
+# --- Queries ---
+
+def since_date(since=None, years=None):
+    # Raises ValueError for anything that isn't a real date / positive span
+    if since:
+        parsed = parse_date(since)
+        if parsed is None:
+            raise ValueError(f"Invalid since date: {since!r} (expected YYYY-MM-DD)")
+        return parsed
+    if years:
+        try:
+            span = float(years)
+            if not span > 0:
+                raise ValueError
+            return (date.today() - timedelta(days=round(365.25 * span))).isoformat()
+        except (ValueError, OverflowError):
+            raise ValueError(f"Invalid years: {years!r} (expected a positive number)")
+    return None
+
+def contaminant_codes(conn, name):
+    rows = conn.execute("SELECT code FROM contaminants WHERE name LIKE ?", (f"%{name}%",)).fetchall()
+    return [r[0] for r in rows]
+
+def violation_filters(conn, contaminant=None, since=None, pwsid=None, colonia_only=False):
+    clauses, params = [], []
+    if contaminant:
+        codes = [contaminant] if contaminant.isdigit() else contaminant_codes(conn, contaminant)
+        if codes:
+            clauses.append(f"v.contaminant_code IN ({', '.join('?' * len(codes))})")
+            params.extend(codes)
+        else:
+            clauses.append("0")
+    if since:
+        clauses.append("v.violation_date >= ?")
+        params.append(since)
+    if pwsid:
+        clauses.append("v.pwsid = ?")
+        params.append(pwsid)
+    if colonia_only:
+        clauses.append("EXISTS (SELECT 1 FROM colonia_systems c WHERE c.pwsid = v.pwsid)")
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    return where, params
+
+def query_violations(contaminant=None, since=None, pwsid=None, colonia_only=False, limit=1000, conn=None):
+    own = conn is None
+    conn = conn or connect()
+    try:
+        where, params = violation_filters(conn, contaminant, since, pwsid, colonia_only)
+        rows = conn.execute(
+            f"SELECT v.* FROM violations v {where} ORDER BY v.violation_date DESC LIMIT ?",
+            params + [limit],
+        ).fetchall()
+        return [dict(r) for r in rows]
+    finally:
+        if own:
+            conn.close()
+
+def systems_with_violations(contaminant=None, since=None, colonia_only=False, limit=1000, conn=None):
+    own = conn is None
+    conn = conn or connect()
+    try:
+        where, params = violation_filters(conn, contaminant, since, None, colonia_only)
+        rows = conn.execute(
+            f"""SELECT v.pwsid, COUNT(*) AS violation_count, MAX(v.violation_date) AS latest_violation,
+                       (SELECT GROUP_CONCAT(c.colonia, '; ') FROM colonia_systems c WHERE c.pwsid = v.pwsid) AS colonias
+                FROM violations v {where}
+                GROUP BY v.pwsid
+                ORDER BY violation_count DESC, latest_violation DESC
+                LIMIT ?""",
+            params + [limit],
+        ).fetchall()
+        return [dict(r) for r in rows]
+    finally:
+        if own:
+            conn.close()
+
+def query_facilities(facility_type=None, status=None, pwsid=None, limit=1000, conn=None):
+    own = conn is None
+    conn = conn or connect()
+    try:
+        clauses, params = [], []
+        if facility_type:
+            clauses.append("f.facility_type LIKE ?")
+            params.append(f"%{facility_type}%")
+        if status:
+            clauses.append("f.facility_status = ?")
+            params.append(status)
+        if pwsid:
+            clauses.append("f.pwsid = ?")
+            params.append(pwsid)
+        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        rows = conn.execute(
+            f"""SELECT f.*, s.production_mgd, s.avg_daily_mgd, s.max_daily_mgd, s.storage_gal
+                FROM facilities f LEFT JOIN system_capacity s ON s.pwsid = f.pwsid
+                {where} ORDER BY f.pwsid, f.facility_id LIMIT ?""",
+            params + [limit],
+        ).fetchall()
+        return [dict(r) for r in rows]
+    finally:
+        if own:
+            conn.close()
+
+# --- Bulk harvest ---
+
+def harvest(pwsids, conn=None):
+    import logic
+    for pwsid in pwsids:
+        try:
+            url, url2 = logic.get_dww_url(pwsid)
+            df_ent, df_fac, df_gv, df_iv = logic.scrape_fact_page(pwsid, url, url2)
+            if save_scrape(pwsid, df_fac, df_gv, df_iv, conn=conn):
+                print(f"Harvested {pwsid}")
+            else:
+                print(f"Incomplete scrape for {pwsid}, not stored")
+        except Exception as e:
+            print(f"Could not harvest {pwsid}: {e}")
+
+def main(argv=None):
+    import argparse
+    import logic
+    parser = argparse.ArgumentParser(description="Build the WaterFX violations and facilities store")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('colonias', help="load the colonia to PWS mapping from the shapefiles")
+    p = subparsers.add_parser('harvest', help="scrape DWW and store violations and facilities")
+    p.add_argument('pwsids', nargs='*', help="systems to harvest (default: every system in PWS_Export)")
+    p.add_argument('--limit', type=int)
+    args = parser.parse_args(argv)
+
+    conn = connect()
+    try:
+        if args.command == 'colonias':
+            save_colonias(logic.load_colonias_by_pws(logic.load_pws_layer()), conn=conn)
+        else:
+            pwsids = args.pwsids or sorted(logic.load_pws_index())
+            harvest(pwsids[:args.limit] if args.limit else pwsids, conn=conn)
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
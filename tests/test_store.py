@@ -0,0 +1,97 @@
+import math
+
+import pandas as pd
+import pytest
+
+import store
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = store.connect(str(tmp_path / "store.sqlite"))
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("value", [None, float('nan'), pd.NA, pd.NaT, "", "   "])
+def test_normalizers_treat_missing_values_as_none(value):
+    assert store.parse_date(value) is None
+    assert store.parse_number(value) is None
+    assert store.parse_unit(value) is None
+    assert store.parse_storage_gal(value) is None
+    assert store.split_contaminant(value) == (None, None)
+
+
+def test_parse_number():
+    assert store.parse_number("1.234") == 1.234
+    assert store.parse_number(".5") == 0.5
+    assert store.parse_number("12,000 GAL") == 12000.0
+    assert store.parse_number("Not Available") is None
+
+
+def test_parse_storage_gal():
+    assert store.parse_storage_gal("12,000 GAL") == 12000.0
+    assert store.parse_storage_gal("0.5 MG") == 500000.0
+    assert store.parse_storage_gal("3 ACRE-FT") is None
+
+
+def test_parse_date():
+    assert store.parse_date("01-15-2023") == "2023-01-15"
+    assert store.parse_date("01/15/2023") == "2023-01-15"
+    assert store.parse_date("13-01-2023") is None
+
+
+def test_split_contaminant():
+    assert store.split_contaminant("3014 E. COLI") == ("3014", "E. COLI")
+    assert store.split_contaminant("LEAD") == (None, "LEAD")
+
+
+def test_violation_rows_skip_placeholder_rows():
+    # scrape_fact_page appends an all-None row after a mid-table exception
+    df = pd.DataFrame([
+        {"Violation No.": "123", "Date": "03-05-2025", "Violation": "MCL", "Contaminant": "3014 E. COLI"},
+        {"Violation No.": None, "Date": None, "Violation": None, "Contaminant": None},
+    ])
+    rows = store.violation_rows("TX0000001", "individual", df)
+    assert rows == [("TX0000001", "individual", "123", "2025-03-05", "MCL", "3014", "E. COLI")]
+
+
+def facilities(*ids):
+    return pd.DataFrame([
+        {"facility_id": fid, "facility_type": "WELL" if fid else None, "facility_status": "A" if fid else None,
+         "production_mgd": "1.5", "storage_cap": "0.2 MG", "avg_daily": "Not Available", "max_daily": ".9"}
+        for fid in ids
+    ])
+
+
+def test_scrape_complete_ignores_placeholder_facilities():
+    assert not store.scrape_complete(facilities(None))
+    assert store.scrape_complete(facilities("G1", None))
+
+
+def test_save_scrape_with_placeholder_rows(conn):
+    df_iv = pd.DataFrame([
+        {"Violation No.": "123", "Date": "03-05-2025", "Violation": "MCL", "Contaminant": "3014 E. COLI"},
+        {"Violation No.": None, "Date": None, "Violation": None, "Contaminant": None},
+    ])
+    assert store.save_scrape("TX0000001", facilities("G1", None), None, df_iv, conn=conn)
+    assert [tuple(r) for r in conn.execute("SELECT facility_id FROM facilities")] == [("G1",)]
+    assert [tuple(r) for r in conn.execute("SELECT code, name FROM contaminants")] == [("3014", "E. COLI")]
+    capacity = conn.execute("SELECT * FROM system_capacity").fetchone()
+    assert capacity["storage_gal"] == 200000.0
+    assert capacity["avg_daily_mgd"] is None
+    assert math.isclose(capacity["max_daily_mgd"], 0.9)
+
+
+def test_incomplete_scrape_keeps_stored_data(conn):
+    store.save_scrape("TX0000001", facilities("G1"), None, None, conn=conn)
+    assert not store.save_scrape("TX0000001", facilities(None), None, None, conn=conn)
+    assert conn.execute("SELECT COUNT(*) FROM facilities").fetchone()[0] == 1
+
+
+def test_save_colonias_only_writes_changes(conn):
+    df = pd.DataFrame([{"PWSId": "TX0000001", "NAME": ["A", "B"]}])
+    assert store.save_colonias(df, conn=conn)
+    assert not store.save_colonias(df, conn=conn)
+    assert store.save_colonias(pd.DataFrame([{"PWSId": "TX0000001", "NAME": ["A"]}]), conn=conn)
+    assert [tuple(r) for r in conn.execute("SELECT * FROM colonia_systems")] == [("TX0000001", "A")]